@@ -4,6 +4,7 @@
 
 from argparse import ArgumentParser
 import contextlib
+from http import HTTPStatus
 from http.server import SimpleHTTPRequestHandler
 from http.server import ThreadingHTTPServer
 import os
@@ -23,15 +24,85 @@ class MyHTTPRequestHandler(SimpleHTTPRequestHandler):
         "": "application/octet-stream",
     }
 
+    # Precompressed siblings (e.g. test.wasm.br), in order of preference
+    precompressed_map = {
+        "br": ".br",
+        "gzip": ".gz",
+    }
+
     def __init__(self, *args, maps=None, **kwargs):
         self.maps = maps or []
+        self.vary_encoding = False
         SimpleHTTPRequestHandler.__init__(self, *args, **kwargs)
 
     def end_headers(self):
         self.send_my_headers()
         SimpleHTTPRequestHandler.end_headers(self)
 
+    def send_head(self):
+        path = self.translate_path(self.path)
+        candidates = self.fresh_precompressed(path)
+        # Any response for a file with usable siblings depends on Accept-Encoding
+        self.vary_encoding = bool(candidates)
+        accepted = self.accepted_encodings()
+        for encoding, compressed_path in candidates:
+            if encoding not in accepted:
+                continue
+            try:
+                f = open(compressed_path, "rb")
+            except OSError:
+                continue
+            fs = os.fstat(f.fileno())
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-type", self.guess_type(path))
+            self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(fs.st_size))
+            self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
+            self.end_headers()
+            return f
+        return super().send_head()
+
+    def fresh_precompressed(self, path):
+        # Siblings older than the original are leftovers from a previous build
+        if not os.path.isfile(path):
+            return []
+        original_mtime = os.stat(path).st_mtime
+        candidates = []
+        for encoding, suffix in self.precompressed_map.items():
+            try:
+                if os.stat(path + suffix).st_mtime >= original_mtime:
+                    candidates.append((encoding, path + suffix))
+            except OSError:
+                pass
+        return candidates
+
+    def accepted_encodings(self):
+        # "*" is deliberately ignored: only codings the client names explicitly are served
+        accepted = set()
+        for element in self.headers.get("Accept-Encoding", "").split(","):
+            coding, *params = element.split(";")
+            coding = coding.strip().lower()
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            if coding and q > 0:
+                accepted.add(coding)
+        return accepted
+
+    def copyfile(self, source, outputfile):
+        # Let the kernel copy file contents straight to the socket.
+        # socket.sendfile falls back to send() for non-regular files (e.g. directory listings).
+        outputfile.flush()
+        self.connection.sendfile(source)
+
     def send_my_headers(self):
+        if self.vary_encoding:
+            self.send_header("Vary", "Accept-Encoding")
         self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
         self.send_header("Pragma", "no-cache")
         self.send_header("Expires", "0")
@@ -46,11 +117,28 @@ class MyHTTPRequestHandler(SimpleHTTPRequestHandler):
         return res
 
 
+def get_best_families(port: int):
+    infos = socket.getaddrinfo(None, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)
+    # Prefer IPv6: DualStackServer clears IPV6_V6ONLY so IPv4 clients are accepted too
+    infos.sort(key=lambda info: info[0] != socket.AF_INET6)
+    return [(family, sockaddr) for family, _, _, _, sockaddr in infos]
+
+
 def serve_forever(port: int, ServerClass):
     handler = MyHTTPRequestHandler
 
-    addr = ("0.0.0.0", port)
-    with ServerClass(addr, handler) as httpd:
+    families = get_best_families(port)
+    for i, (family, addr) in enumerate(families):
+        # Per-call subclass, so the caller's ServerClass keeps its address_family
+        FamilyServer = type(ServerClass.__name__, (ServerClass,), {"address_family": family})
+        try:
+            httpd = FamilyServer(addr, handler)
+            break
+        except OSError:
+            # getaddrinfo lists "::" even where IPv6 is disabled; try the next family
+            if i == len(families) - 1:
+                raise
+    with httpd:
         host, port = httpd.socket.getsockname()[:2]
         url_host = f"[{host}]" if ":" in host else host
         print(f"Serving HTTP on {host} port {port} (http://{url_host}:{port}/) ...")